@@ -1,3 +1,4 @@
+import io
 import logging
 import os
 import time
@@ -5,15 +6,25 @@ import traceback
 import uuid
 
 import cv2
+import keras_compat  # noqa: F401  (selects tf-keras; must precede tensorflow)
 import numpy as np
 import tensorflow as tf
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, jsonify, request, send_file, send_from_directory
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from gemini_service import generate_explanation
-from gradcam import make_gradcam_heatmap, overlay_heatmap, preprocess_image
+from gradcam import IMREAD_FLAGS, make_gradcam_heatmap, overlay_heatmap, preprocess_image
+from image_guard import DecodeBudget, ImageGuardError, plan_decode, probe_image
+from profiling import (
+    MAX_PROFILE_SECONDS,
+    ProfileInProgressError,
+    capture_profile,
+    register_request_thread,
+    trace,
+    unregister_request_thread,
+)
 from werkzeug.exceptions import HTTPException
 
 logging.basicConfig(level=logging.INFO)
@@ -27,6 +38,24 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 DEFAULT_RATE_LIMIT = os.getenv("DEFAULT_RATE_LIMIT", "60 per minute")
 ANALYZE_RATE_LIMIT = os.getenv("ANALYZE_RATE_LIMIT", "20 per minute")
 API_KEY = os.getenv("API_KEY", "").strip()
+# The admin profiling endpoint is off unless explicitly enabled, and always needs API_KEY.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").strip().lower() in ("1", "true", "yes")
+
+# Upload and decode budgets. Images are checked from their header before any decoding.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(100_000_000)))
+MAX_DECODE_PIXELS = int(os.getenv("MAX_DECODE_PIXELS", str(16_777_216)))
+MAX_IMAGE_FRAMES = int(os.getenv("MAX_IMAGE_FRAMES", "100"))
+DECODE_MEMORY_BUDGET_BYTES = int(os.getenv("DECODE_MEMORY_BUDGET_BYTES", str(1024 * 1024 * 1024)))
+DECODE_WAIT_SECONDS = float(os.getenv("DECODE_WAIT_SECONDS", "10"))
+
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
+decode_budget = DecodeBudget(DECODE_MEMORY_BUDGET_BYTES)
+
+# Track which threads are serving requests so profiles only sample the request path.
+if PROFILING_ENABLED:
+    app.before_request(register_request_thread)
+    app.teardown_request(unregister_request_thread)
 
 limiter = Limiter(
     key_func=get_remote_address,
@@ -68,6 +97,13 @@ def _is_request_authorized(req):
     return incoming == API_KEY
 
 
+@app.errorhandler(ImageGuardError)
+def handle_rejected_image(error):
+    """Uploads rejected by the pre-decode guard (bad header, over budget, server busy)."""
+    logger.warning("Rejected image upload: %s", error)
+    return jsonify({"error": error.error, "message": str(error)}), error.status_code
+
+
 @app.errorhandler(Exception)
 def handle_unexpected_error(error):
     """
@@ -112,8 +148,13 @@ def analyze():
 
     file = request.files["image"]
 
+    # Reject oversized images from their header alone, before writing or decoding anything.
+    image_info = probe_image(file.stream)
+    decode_plan = plan_decode(image_info, MAX_IMAGE_PIXELS, MAX_DECODE_PIXELS, MAX_IMAGE_FRAMES)
+
     # Always persist the originally uploaded image at full resolution.
     # The model will see a resized version, but the saved file is untouched.
+    # Very large JPEGs are decoded at a reduced scale (see decode_plan).
     filename = str(uuid.uuid4()) + ".png"
     filepath = os.path.join(UPLOAD_FOLDER, filename)
     file.save(filepath)
@@ -121,64 +162,72 @@ def analyze():
     # Measure end-to-end processing time
     started_at = time.perf_counter_ns()
 
-    if model is None:
-        # Fallback path when the trained model file is not available.
-        # This keeps the API and UI fully functional with deterministic,
-        # image-dependent values instead of a constant output.
-        original_bgr = cv2.imread(filepath)
-        if original_bgr is None:
-            return jsonify({"error": "Uploaded image could not be read by OpenCV."}), 400
-
-        original = cv2.cvtColor(original_bgr, cv2.COLOR_BGR2RGB)
-
-        # Create a pseudo-heatmap from a lightly blurred grayscale image.
-        gray = cv2.cvtColor(original, cv2.COLOR_RGB2GRAY)
-        gray_blur = cv2.GaussianBlur(gray, (15, 15), 0)
-        norm_heatmap = cv2.normalize(gray_blur.astype(np.float32), None, 0.0, 1.0, cv2.NORM_MINMAX)
-
-        result = overlay_heatmap(norm_heatmap, original)
-
-        # Save heatmap overlay as PNG to avoid additional JPEG compression loss.
-        output_filename = str(uuid.uuid4()) + ".png"
-        output_path = os.path.join(OUTPUT_FOLDER, output_filename)
-        cv2.imwrite(output_path, cv2.cvtColor(result, cv2.COLOR_RGB2BGR))
-
-        activation_strength = float(norm_heatmap.mean())
-
-        # Simple heuristic so that probabilities vary across images.
-        mean_intensity = float(gray.mean() / 255.0)
-        real_probability = max(0.05, min(0.95, mean_intensity))
-        fake_probability = 1.0 - real_probability
-
-        label = "REAL" if real_probability >= fake_probability else "FAKE"
-        confidence = float(max(real_probability, fake_probability) * 100)
-    else:
-        # Full inference path using the trained model and Grad-CAM.
-        img_array, original = preprocess_image(filepath)
+    # Hold a share of the global decode budget while full-size buffers are alive.
+    with decode_budget.reserve(decode_plan.estimated_bytes, timeout=DECODE_WAIT_SECONDS):
+        if model is None:
+            # Fallback path when the trained model file is not available.
+            # This keeps the API and UI fully functional with deterministic,
+            # image-dependent values instead of a constant output.
+            original_bgr = cv2.imread(filepath, IMREAD_FLAGS[decode_plan.scale])
+            if original_bgr is None:
+                return jsonify({"error": "Uploaded image could not be read by OpenCV."}), 400
+
+            original = cv2.cvtColor(original_bgr, cv2.COLOR_BGR2RGB)
+
+            # Create a pseudo-heatmap from a lightly blurred grayscale image.
+            gray = cv2.cvtColor(original, cv2.COLOR_RGB2GRAY)
+            gray_blur = cv2.GaussianBlur(gray, (15, 15), 0)
+            norm_heatmap = cv2.normalize(
+                gray_blur.astype(np.float32), None, 0.0, 1.0, cv2.NORM_MINMAX
+            )
+
+            result = overlay_heatmap(norm_heatmap, original)
+
+            # Save heatmap overlay as PNG at the decoded resolution (reduced for very large JPEGs)
+            # to avoid additional JPEG compression loss.
+            output_filename = str(uuid.uuid4()) + ".png"
+            output_path = os.path.join(OUTPUT_FOLDER, output_filename)
+            cv2.imwrite(output_path, cv2.cvtColor(result, cv2.COLOR_RGB2BGR))
+
+            activation_strength = float(norm_heatmap.mean())
+
+            # Simple heuristic so that probabilities vary across images.
+            mean_intensity = float(gray.mean() / 255.0)
+            real_probability = max(0.05, min(0.95, mean_intensity))
+            fake_probability = 1.0 - real_probability
+
+            label = "REAL" if real_probability >= fake_probability else "FAKE"
+            confidence = float(max(real_probability, fake_probability) * 100)
+        else:
+            # Full inference path using the trained model and Grad-CAM.
+            img_array, original = preprocess_image(filepath, scale=decode_plan.scale)
 
-        # Robustly extract a scalar prediction regardless of output shape.
-        prediction_raw = model.predict(img_array)
-        pred = float(np.ravel(prediction_raw)[0])
+            # Robustly extract a scalar prediction regardless of output shape.
+            with trace("predict"):
+                prediction_raw = model.predict(img_array)
+            pred = float(np.ravel(prediction_raw)[0])
 
-        real_probability = pred
-        fake_probability = 1.0 - pred
+            real_probability = pred
+            fake_probability = 1.0 - pred
 
-        if pred > 0.5:
-            label = "REAL"
-            confidence = float(pred * 100)
-        else:
-            label = "FAKE"
-            confidence = float((1 - pred) * 100)
+            if pred > 0.5:
+                label = "REAL"
+                confidence = float(pred * 100)
+            else:
+                label = "FAKE"
+                confidence = float((1 - pred) * 100)
 
-        heatmap = make_gradcam_heatmap(img_array, model)
-        result = overlay_heatmap(heatmap, original)
+            with trace("gradcam"):
+                heatmap = make_gradcam_heatmap(img_array, model)
+            result = overlay_heatmap(heatmap, original)
 
-        # Save heatmap overlay as PNG at the original image resolution.
-        output_filename = str(uuid.uuid4()) + ".png"
-        output_path = os.path.join(OUTPUT_FOLDER, output_filename)
-        cv2.imwrite(output_path, cv2.cvtColor(result, cv2.COLOR_RGB2BGR))
+            # Save heatmap overlay as PNG at the decoded resolution: the original size,
+            # or 1/2 to 1/8 of it for very large JPEGs (see decode_plan).
+            output_filename = str(uuid.uuid4()) + ".png"
+            output_path = os.path.join(OUTPUT_FOLDER, output_filename)
+            cv2.imwrite(output_path, cv2.cvtColor(result, cv2.COLOR_RGB2BGR))
 
-        activation_strength = float(heatmap.mean())
+            activation_strength = float(heatmap.mean())
 
     finished_at = time.perf_counter_ns()
     inference_time_ms = int((finished_at - started_at) / 1_000_000)
@@ -205,6 +254,44 @@ def analyze():
     )
 
 
+@app.route("/admin/profile", methods=["POST"])
+def capture_admin_profile():
+    """
+    Capture a time-boxed profile of this process and return it as a zip download.
+    Query parameters: `seconds` (default 10) and `tf_trace` (default 1).
+    """
+    if not PROFILING_ENABLED:
+        return jsonify({"error": "Not Found", "message": "Profiling is disabled."}), 404
+
+    # Unlike /analyze, there is no unauthenticated local-development mode here.
+    if not API_KEY or not _is_request_authorized(request):
+        return jsonify({"error": "Unauthorized", "message": "Missing or invalid API key."}), 401
+
+    try:
+        seconds = float(request.args.get("seconds", 10))
+    except ValueError:
+        return jsonify({"error": "Invalid 'seconds' parameter"}), 400
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        return (
+            jsonify({"error": f"'seconds' must be between 0 and {MAX_PROFILE_SECONDS}"}),
+            400,
+        )
+    tf_trace = request.args.get("tf_trace", "1").strip().lower() not in ("0", "false", "no")
+
+    logger.info("Capturing %.1fs profile (tf_trace=%s)", seconds, tf_trace)
+    try:
+        archive = capture_profile(seconds, tf_trace=tf_trace)
+    except ProfileInProgressError as e:
+        return jsonify({"error": "Conflict", "message": str(e)}), 409
+
+    return send_file(
+        io.BytesIO(archive),
+        mimetype="application/zip",
+        as_attachment=True,
+        download_name=f"profile-{time.strftime('%Y%m%d-%H%M%S')}.zip",
+    )
+
+
 @app.route("/outputs/<filename>")
 def get_output(filename):
     return send_from_directory(OUTPUT_FOLDER, filename)
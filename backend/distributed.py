@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+from dataclasses import dataclass
+
+# Helpers for multi-worker training. Kept free of TensorFlow imports so the
+# cluster-spec handling can be unit tested and used by the local launcher
+# without paying the TF import cost in the parent process.
+
+
+@dataclass(frozen=True)
+class ClusterInfo:
+    """Summary of the current process's place in a TF_CONFIG cluster."""
+
+    num_workers: int
+    task_type: str
+    task_index: int
+    has_chief_task: bool = False
+
+    @property
+    def is_chief(self):
+        return is_chief(self.task_type, self.task_index, self.has_chief_task)
+
+    @property
+    def is_distributed(self):
+        return self.num_workers > 1
+
+
+def read_cluster_info(environ=None):
+    """
+    Parse TF_CONFIG from the environment.
+    Without a TF_CONFIG the process is treated as a single chief worker.
+    """
+    environ = os.environ if environ is None else environ
+    raw = environ.get("TF_CONFIG", "").strip()
+    if not raw:
+        return ClusterInfo(num_workers=1, task_type="worker", task_index=0)
+
+    try:
+        config = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"TF_CONFIG is not valid JSON: {e}") from e
+
+    cluster = config.get("cluster", {})
+    task = config.get("task", {})
+    num_workers = len(cluster.get("worker", [])) + len(cluster.get("chief", []))
+    if num_workers == 0:
+        raise ValueError("TF_CONFIG cluster spec does not list any 'worker' or 'chief' tasks.")
+
+    return ClusterInfo(
+        num_workers=num_workers,
+        task_type=task.get("type", "worker"),
+        task_index=int(task.get("index", 0)),
+        has_chief_task=bool(cluster.get("chief")),
+    )
+
+
+def is_chief(task_type, task_index, has_chief_task=False):
+    """Worker 0 acts as chief unless the cluster defines an explicit 'chief' task."""
+    if task_type == "chief":
+        return True
+    return not has_chief_task and task_type == "worker" and task_index == 0
+
+
+def build_tf_config(worker_addresses, task_index):
+    """Return the TF_CONFIG JSON string for worker `task_index` of the given cluster."""
+    return json.dumps(
+        {
+            "cluster": {"worker": list(worker_addresses)},
+            "task": {"type": "worker", "index": task_index},
+        }
+    )
+
+
+def find_free_ports(count, host="localhost"):
+    """Reserve `count` distinct free TCP ports on `host`."""
+    sockets = []
+    try:
+        for _ in range(count):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind((host, 0))
+            sockets.append(sock)
+        return [sock.getsockname()[1] for sock in sockets]
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+def launch_local_workers(num_workers, script, args=(), host="localhost"):
+    """
+    Run `script` as `num_workers` local processes forming one training cluster.
+    Each process receives its own TF_CONFIG; returns the first non-zero exit code.
+    """
+    ports = find_free_ports(num_workers, host=host)
+    addresses = [f"{host}:{port}" for port in ports]
+
+    processes = []
+    for index in range(num_workers):
+        env = dict(os.environ, TF_CONFIG=build_tf_config(addresses, index))
+        processes.append(subprocess.Popen([sys.executable, script, *args], env=env))
+
+    exit_code = 0
+    for process in processes:
+        code = process.wait()
+        if code != 0 and exit_code == 0:
+            exit_code = code
+    return exit_code
+
+
+def scaled_learning_rate(base_lr, num_replicas):
+    """Linear scaling rule: grow the learning rate with the global batch size."""
+    return base_lr * max(1, num_replicas)
+
+
+def warmup_learning_rate(step, base_lr, target_lr, warmup_steps):
+    """Linearly ramp from `base_lr` to `target_lr` over the first `warmup_steps` steps."""
+    if warmup_steps <= 0 or step >= warmup_steps:
+        return target_lr
+    return base_lr + (target_lr - base_lr) * (step / warmup_steps)
+
+
+def write_filepath(filepath, cluster_info):
+    """
+    Every worker must take part in saving, but only the chief should write to
+    the real destination. Other workers write to a throwaway temp directory.
+    """
+    if cluster_info.is_chief:
+        return filepath
+    temp_dir = tempfile.mkdtemp(prefix=f"{cluster_info.task_type}{cluster_info.task_index}_")
+    return os.path.join(temp_dir, os.path.basename(filepath))
+
+
+def cleanup_filepath(filepath, cluster_info):
+    """Remove the temp directory created by `write_filepath` on non-chief workers."""
+    if not cluster_info.is_chief:
+        shutil.rmtree(os.path.dirname(filepath), ignore_errors=True)
@@ -2,6 +2,7 @@ import os
 import sys
 
 import cv2
+import keras_compat  # noqa: F401  (selects tf-keras; must precede tensorflow)
 import numpy as np
 import tensorflow as tf
 
@@ -11,9 +12,18 @@ IMG_SIZE = (224, 224)
 LAST_CONV_LAYER = "Conv_1"
 
 
-def preprocess_image(img_path):
+# Decode flags per downscale factor; reduced flags let libjpeg decode JPEGs at 1/2, 1/4 or 1/8 size.
+IMREAD_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
 
-    img = cv2.imread(img_path)
+
+def preprocess_image(img_path, scale=1):
+
+    img = cv2.imread(img_path, IMREAD_FLAGS[scale])
 
     if img is None:
         raise ValueError("❌ Image not found")
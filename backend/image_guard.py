@@ -0,0 +1,327 @@
+import contextlib
+import math
+import struct
+import threading
+from dataclasses import dataclass
+
+# Pre-decode checks for uploaded images.
+# Dimensions, format and frame count are read from the container header only,
+# so oversized images and decompression bombs are rejected before any pixels
+# are decoded. Concurrent decodes share a global memory budget.
+
+# Formats OpenCV can decode directly at 1/2, 1/4 or 1/8 scale (libjpeg DCT scaling).
+# Other formats are decoded at full size, so they only ever get scale 1.
+REDUCED_DECODE_FORMATS = {"jpeg"}
+DECODE_SCALES = (1, 2, 4, 8)
+
+# Rough working set per decoded pixel across the analyze pipeline:
+# BGR decode, RGB copy, float32 heatmap resize, colour map and blended overlay.
+BYTES_PER_DECODED_PIXEL = 24
+
+# Progressive JPEGs buffer every DCT coefficient (16-bit) of the whole image at full
+# resolution, whatever the output scale, before producing any pixels.
+BYTES_PER_JPEG_COEFFICIENT = 2
+
+_JPEG_SOF_MARKERS = {
+    0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF
+}  # fmt: skip
+_JPEG_PROGRESSIVE_SOF_MARKERS = {0xC2, 0xC6, 0xCA, 0xCE}
+_JPEG_STANDALONE_MARKERS = {0x01, *range(0xD0, 0xD8)}
+
+
+class ImageGuardError(ValueError):
+    """Base class for uploads rejected before decoding."""
+
+    status_code = 400
+    error = "Invalid image"
+
+
+class UnsupportedImageError(ImageGuardError):
+    status_code = 400
+    error = "Unsupported image"
+
+
+class ImageTooLargeError(ImageGuardError):
+    status_code = 413
+    error = "Image too large"
+
+
+class DecodeBudgetExceededError(ImageGuardError):
+    status_code = 503
+    error = "Server busy"
+
+
+@dataclass(frozen=True)
+class ImageInfo:
+    format: str
+    width: int
+    height: int
+    frames: int = 1
+    progressive: bool = False
+    components: int = 3
+
+    @property
+    def pixels(self):
+        return self.width * self.height
+
+
+@dataclass(frozen=True)
+class DecodePlan:
+    scale: int
+    width: int
+    height: int
+    # Full-resolution decoder buffers that do not shrink with `scale`.
+    decoder_bytes: int = 0
+
+    @property
+    def estimated_bytes(self):
+        return self.width * self.height * BYTES_PER_DECODED_PIXEL + self.decoder_bytes
+
+
+# ==============================
+# HEADER PROBES
+# ==============================
+
+
+def _read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise UnsupportedImageError("Image header is truncated.")
+    return data
+
+
+def _probe_png(stream):
+    stream.seek(8)
+    length, chunk_type = struct.unpack(">I4s", _read_exact(stream, 8))
+    if chunk_type != b"IHDR" or length < 8:
+        raise UnsupportedImageError("PNG is missing its IHDR chunk.")
+    width, height = struct.unpack(">II", _read_exact(stream, 8))
+    stream.seek(length - 8 + 4, 1)
+
+    # Animated PNGs declare their frame count in an acTL chunk before the first IDAT.
+    frames = 1
+    while True:
+        header = stream.read(8)
+        if len(header) < 8:
+            break
+        length, chunk_type = struct.unpack(">I4s", header)
+        if chunk_type in (b"IDAT", b"IEND"):
+            break
+        if chunk_type == b"acTL":
+            frames = struct.unpack(">I", _read_exact(stream, 4))[0]
+            length -= 4
+        stream.seek(length + 4, 1)
+    return ImageInfo("png", width, height, frames)
+
+
+def _probe_jpeg(stream):
+    stream.seek(2)
+    while True:
+        if _read_exact(stream, 1) != b"\xff":
+            raise UnsupportedImageError("JPEG marker stream is corrupt.")
+        marker = _read_exact(stream, 1)[0]
+        while marker == 0xFF:  # fill bytes
+            marker = _read_exact(stream, 1)[0]
+        if marker in _JPEG_STANDALONE_MARKERS:
+            continue
+        if marker in (0xD9, 0xDA):
+            raise UnsupportedImageError("JPEG has no frame header before the image data.")
+        (length,) = struct.unpack(">H", _read_exact(stream, 2))
+        if marker in _JPEG_SOF_MARKERS:
+            _, height, width, components = struct.unpack(">BHHB", _read_exact(stream, 6))
+            return ImageInfo(
+                "jpeg",
+                width,
+                height,
+                progressive=marker in _JPEG_PROGRESSIVE_SOF_MARKERS,
+                components=components,
+            )
+        stream.seek(length - 2, 1)
+
+
+def _skip_gif_sub_blocks(stream):
+    while True:
+        size = _read_exact(stream, 1)[0]
+        if size == 0:
+            return
+        stream.seek(size, 1)
+
+
+def _probe_gif(stream):
+    stream.seek(6)
+    width, height, packed = struct.unpack("<HHB", _read_exact(stream, 5))
+    stream.seek(2, 1)
+    if packed & 0x80:
+        stream.seek(3 * (2 << (packed & 0x07)), 1)
+
+    # Walk every block to count frames; a frame may extend past the logical screen.
+    frames = 0
+    while True:
+        block = stream.read(1)
+        if block in (b"", b"\x3b"):
+            break
+        if block == b"\x21":
+            stream.seek(1, 1)
+            _skip_gif_sub_blocks(stream)
+        elif block == b"\x2c":
+            left, top, frame_width, frame_height, packed = struct.unpack(
+                "<HHHHB", _read_exact(stream, 9)
+            )
+            width = max(width, left + frame_width)
+            height = max(height, top + frame_height)
+            frames += 1
+            if packed & 0x80:
+                stream.seek(3 * (2 << (packed & 0x07)), 1)
+            stream.seek(1, 1)
+            _skip_gif_sub_blocks(stream)
+        else:
+            raise UnsupportedImageError("GIF block stream is corrupt.")
+    return ImageInfo("gif", width, height, max(frames, 1))
+
+
+def _probe_webp(stream):
+    stream.seek(12)
+    chunk_type, length = struct.unpack("<4sI", _read_exact(stream, 8))
+    if chunk_type == b"VP8 ":
+        data = _read_exact(stream, 10)
+        if data[3:6] != b"\x9d\x01\x2a":
+            raise UnsupportedImageError("WebP VP8 frame header is corrupt.")
+        width, height = struct.unpack("<HH", data[6:10])
+        return ImageInfo("webp", width & 0x3FFF, height & 0x3FFF)
+    if chunk_type == b"VP8L":
+        data = _read_exact(stream, 5)
+        if data[0] != 0x2F:
+            raise UnsupportedImageError("WebP lossless header is corrupt.")
+        bits = struct.unpack("<I", data[1:5])[0]
+        return ImageInfo("webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+    if chunk_type == b"VP8X":
+        data = _read_exact(stream, 10)
+        width = int.from_bytes(data[4:7], "little") + 1
+        height = int.from_bytes(data[7:10], "little") + 1
+        frames = 1
+        if data[0] & 0x02:
+            stream.seek(length - 10 + (length & 1), 1)
+            frames = 0
+            while True:
+                header = stream.read(8)
+                if len(header) < 8:
+                    break
+                chunk_type, length = struct.unpack("<4sI", header)
+                frames += chunk_type == b"ANMF"
+                stream.seek(length + (length & 1), 1)
+        return ImageInfo("webp", width, height, max(frames, 1))
+    raise UnsupportedImageError("WebP has an unknown first chunk.")
+
+
+def _probe_bmp(stream):
+    stream.seek(14)
+    (header_size,) = struct.unpack("<I", _read_exact(stream, 4))
+    if header_size == 12:
+        width, height = struct.unpack("<HH", _read_exact(stream, 4))
+    else:
+        width, height = struct.unpack("<ii", _read_exact(stream, 8))
+    # Negative height marks a top-down bitmap.
+    return ImageInfo("bmp", abs(width), abs(height))
+
+
+def probe_image(stream):
+    """
+    Read format, dimensions and frame count from an image file object's header.
+    Only the container metadata is read; the stream is rewound afterwards.
+    Raises UnsupportedImageError for unknown or malformed files.
+    """
+    try:
+        stream.seek(0)
+        signature = stream.read(16)
+        if signature.startswith(b"\x89PNG\r\n\x1a\n"):
+            info = _probe_png(stream)
+        elif signature.startswith(b"\xff\xd8"):
+            info = _probe_jpeg(stream)
+        elif signature[:6] in (b"GIF87a", b"GIF89a"):
+            info = _probe_gif(stream)
+        elif signature[:4] == b"RIFF" and signature[8:12] == b"WEBP":
+            info = _probe_webp(stream)
+        elif signature[:2] == b"BM":
+            info = _probe_bmp(stream)
+        else:
+            raise UnsupportedImageError("Supported formats are JPEG, PNG, GIF, WebP and BMP.")
+    except struct.error as e:
+        raise UnsupportedImageError("Image header is malformed.") from e
+    finally:
+        stream.seek(0)
+
+    if info.width <= 0 or info.height <= 0:
+        raise UnsupportedImageError("Image header reports empty dimensions.")
+    return info
+
+
+# ==============================
+# BUDGETS
+# ==============================
+
+
+def plan_decode(info, max_pixels, max_decode_pixels, max_frames):
+    """
+    Check an image against the pixel and frame budgets and choose a decode scale.
+    `max_pixels` caps the declared size; `max_decode_pixels` caps what is actually
+    decoded, using a reduced scale where the format supports it.
+    """
+    if info.frames > max_frames:
+        raise ImageTooLargeError(f"Image has {info.frames} frames; the limit is {max_frames}.")
+    if info.pixels > max_pixels:
+        raise ImageTooLargeError(
+            f"Image is {info.width}x{info.height} pixels; the limit is {max_pixels} pixels."
+        )
+
+    decoder_bytes = 0
+    if info.progressive:
+        decoder_bytes = info.pixels * info.components * BYTES_PER_JPEG_COEFFICIENT
+
+    scales = DECODE_SCALES if info.format in REDUCED_DECODE_FORMATS else (1,)
+    for scale in scales:
+        width = math.ceil(info.width / scale)
+        height = math.ceil(info.height / scale)
+        if width * height <= max_decode_pixels:
+            return DecodePlan(scale, width, height, decoder_bytes)
+
+    raise ImageTooLargeError(
+        f"Image is {info.width}x{info.height} pixels; {info.format.upper()} images are "
+        f"limited to {max_decode_pixels} decoded pixels."
+    )
+
+
+class DecodeBudget:
+    """
+    Global byte budget shared by concurrent decodes.
+    Requests wait up to `timeout` seconds for room before being turned away.
+    """
+
+    def __init__(self, total_bytes):
+        self.total_bytes = total_bytes
+        self._in_use = 0
+        self._condition = threading.Condition()
+
+    @property
+    def in_use(self):
+        return self._in_use
+
+    @contextlib.contextmanager
+    def reserve(self, nbytes, timeout=None):
+        if nbytes > self.total_bytes:
+            raise ImageTooLargeError("Image needs more memory than the decode budget allows.")
+
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: self._in_use + nbytes <= self.total_bytes, timeout
+            ):
+                raise DecodeBudgetExceededError(
+                    "Too many large images are being processed. Please try again shortly."
+                )
+            self._in_use += nbytes
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_use -= nbytes
+                self._condition.notify_all()
@@ -0,0 +1,7 @@
+import os
+
+# Training and serving must run on the same Keras, or model.h5 written by train.py
+# cannot be loaded by app.py. We use tf-keras (Keras 2) everywhere: multi-worker
+# BackupAndRestore needs it, and TF >= 2.16 would otherwise switch to Keras 3.
+# Import this module before tensorflow.
+os.environ.setdefault("TF_USE_LEGACY_KERAS", "1")
@@ -2,6 +2,7 @@ import os
 import sys
 
 import cv2
+import keras_compat  # noqa: F401  (selects tf-keras; must precede tensorflow)
 import numpy as np
 import tensorflow as tf
 
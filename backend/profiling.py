@@ -0,0 +1,233 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from collections import Counter
+
+# On-demand profiling for a live backend process.
+# Nothing here runs until `capture_profile` is called: the sampler thread,
+# tracemalloc and the TensorFlow profiler are all started and stopped per capture.
+
+MAX_PROFILE_SECONDS = 60
+DEFAULT_SAMPLE_INTERVAL = 0.005
+DEFAULT_TOP_ALLOCATIONS = 25
+
+_capture_lock = threading.Lock()
+_capturing = False
+# Idents of threads currently serving a request; only these are sampled.
+_request_threads = set()
+
+
+class ProfileInProgressError(RuntimeError):
+    """Raised when a capture is requested while another one is still running."""
+
+
+def is_capturing():
+    return _capturing
+
+
+def register_request_thread():
+    """Mark the calling thread as serving a request (Flask `before_request` hook)."""
+    _request_threads.add(threading.get_ident())
+
+
+def unregister_request_thread(error=None):
+    """Undo `register_request_thread` (Flask `teardown_request` hook)."""
+    _request_threads.discard(threading.get_ident())
+
+
+def active_request_threads():
+    return set(_request_threads)
+
+
+def trace(name):
+    """
+    Annotate a block in the TensorFlow profiler trace.
+    Returns a no-op context unless a capture is currently running.
+    """
+    if not _capturing:
+        return contextlib.nullcontext()
+    import tensorflow as tf
+
+    return tf.profiler.experimental.Trace(name)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class SamplingProfiler:
+    """
+    Periodically samples the Python stacks of the threads returned by `thread_ids`
+    (all other threads when it is None). Samples are wall-clock, so time a thread
+    spends blocked is counted too. Results are aggregated as collapsed stacks
+    (root;...;leaf -> samples), the format consumed by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL, thread_ids=None, ignore_thread_ids=()):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.ignore_thread_ids = set(ignore_thread_ids)
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            wanted = self.thread_ids() if self.thread_ids is not None else None
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or thread_id in self.ignore_thread_ids:
+                    continue
+                if wanted is not None and thread_id not in wanted:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, limit=30):
+        """Text report of the innermost frames with the most wall-clock samples."""
+        self_counts = Counter()
+        for stack, count in self.stacks.items():
+            self_counts[stack.rsplit(";", 1)[-1]] += count
+
+        total = sum(self_counts.values()) or 1
+        lines = [
+            f"{self.samples} sampling rounds every {self.interval * 1000:.1f} ms",
+            "Wall-clock samples of request-serving threads; blocked time is included.",
+            "",
+        ]
+        lines.append(f"{'samples':>8} {'share':>7}  innermost frame")
+        for label, count in self_counts.most_common(limit):
+            lines.append(f"{count:>8} {100 * count / total:>6.1f}%  {label}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_allocations(snapshot, limit):
+    stats = snapshot.statistics("lineno")
+    total = sum(stat.size for stat in stats)
+    lines = [f"Total traced: {total / 1024:.1f} KiB", ""]
+    for index, stat in enumerate(stats[:limit], start=1):
+        frame = stat.traceback[0]
+        lines.append(
+            f"#{index}: {frame.filename}:{frame.lineno}: "
+            f"{stat.size / 1024:.1f} KiB in {stat.count} blocks"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def _start_tf_trace(logdir):
+    """Start the TensorFlow profiler if TensorFlow is importable; return whether it started."""
+    try:
+        import tensorflow as tf
+
+        tf.profiler.experimental.start(logdir)
+        return True
+    except Exception:
+        return False
+
+
+def _stop_tf_trace():
+    import tensorflow as tf
+
+    tf.profiler.experimental.stop()
+
+
+def capture_profile(
+    seconds,
+    tf_trace=True,
+    sample_interval=DEFAULT_SAMPLE_INTERVAL,
+    top_allocations=DEFAULT_TOP_ALLOCATIONS,
+):
+    """
+    Profile the running process for `seconds` and return a zip archive as bytes.
+    The archive contains wall-clock stack samples of threads serving requests
+    (collapsed stacks and a top report), the top tracemalloc allocations, and the
+    TensorFlow profiler trace, if available. The calling thread blocks for the
+    duration and is excluded from the samples.
+    """
+    global _capturing
+
+    seconds = max(0.1, min(float(seconds), MAX_PROFILE_SECONDS))
+    if not _capture_lock.acquire(blocking=False):
+        raise ProfileInProgressError("A profile capture is already in progress.")
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="profile_") as workdir:
+            tf_logdir = os.path.join(workdir, "tf_trace")
+            sampler = SamplingProfiler(
+                sample_interval,
+                thread_ids=active_request_threads,
+                ignore_thread_ids=[threading.get_ident()],
+            )
+
+            # Leave tracemalloc running afterwards if it was enabled before us.
+            owns_tracemalloc = not tracemalloc.is_tracing()
+            if owns_tracemalloc:
+                tracemalloc.start()
+            tf_started = tf_trace and _start_tf_trace(tf_logdir)
+            _capturing = True
+            sampler.start()
+
+            started_at = time.time()
+            try:
+                time.sleep(seconds)
+            finally:
+                sampler.stop()
+                _capturing = False
+                # tracemalloc must be stopped even if the TF profiler fails to stop,
+                # otherwise it keeps tracing for the life of the process.
+                try:
+                    if tf_started:
+                        _stop_tf_trace()
+                finally:
+                    snapshot = tracemalloc.take_snapshot()
+                    if owns_tracemalloc:
+                        tracemalloc.stop()
+
+            summary = (
+                f"started_at: {time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(started_at))}Z\n"
+                f"duration_seconds: {seconds}\n"
+                f"pid: {os.getpid()}\n"
+                f"tf_trace: {'included' if tf_started else 'unavailable' if tf_trace else 'skipped'}\n"
+            )
+
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr("summary.txt", summary)
+                archive.writestr("cpu_profile.folded", sampler.folded())
+                archive.writestr("cpu_profile_top.txt", sampler.top())
+                archive.writestr(
+                    "tracemalloc_top.txt", _format_allocations(snapshot, top_allocations)
+                )
+                for root, _, files in os.walk(tf_logdir):
+                    for name in files:
+                        path = os.path.join(root, name)
+                        archive.write(path, os.path.relpath(path, workdir))
+            return buffer.getvalue()
+    finally:
+        _capture_lock.release()
@@ -1,3 +1,4 @@
+import keras_compat  # noqa: F401  (selects tf-keras; must precede tensorflow)
 import tensorflow as tf
 
 model = tf.keras.models.load_model("model.h5")
@@ -0,0 +1,88 @@
+import json
+import os
+
+import pytest
+from distributed import (
+    build_tf_config,
+    cleanup_filepath,
+    find_free_ports,
+    read_cluster_info,
+    scaled_learning_rate,
+    warmup_learning_rate,
+    write_filepath,
+)
+
+
+def test_missing_tf_config_is_single_chief_worker():
+    info = read_cluster_info({})
+
+    assert info.num_workers == 1
+    assert info.is_chief
+    assert not info.is_distributed
+
+
+def test_build_tf_config_round_trips_through_read_cluster_info():
+    addresses = ["localhost:12345", "localhost:12346", "localhost:12347"]
+
+    chief = read_cluster_info({"TF_CONFIG": build_tf_config(addresses, 0)})
+    worker = read_cluster_info({"TF_CONFIG": build_tf_config(addresses, 2)})
+
+    assert json.loads(build_tf_config(addresses, 1))["cluster"]["worker"] == addresses
+    assert chief.num_workers == 3 and chief.is_chief and chief.is_distributed
+    assert worker.task_index == 2 and not worker.is_chief
+
+
+def test_explicit_chief_task_replaces_worker_zero_as_chief():
+    cluster = {"chief": ["localhost:1"], "worker": ["localhost:2", "localhost:3"]}
+
+    def info_for(task_type, index):
+        tf_config = json.dumps({"cluster": cluster, "task": {"type": task_type, "index": index}})
+        return read_cluster_info({"TF_CONFIG": tf_config})
+
+    chief = info_for("chief", 0)
+    worker_zero = info_for("worker", 0)
+
+    assert chief.num_workers == 3
+    assert chief.is_chief
+    assert not worker_zero.is_chief
+
+    worker_zero_path = write_filepath("model.h5", worker_zero)
+    assert worker_zero_path != "model.h5"
+    cleanup_filepath(worker_zero_path, worker_zero)
+
+
+def test_invalid_tf_config_raises_value_error():
+    with pytest.raises(ValueError):
+        read_cluster_info({"TF_CONFIG": "not json"})
+    with pytest.raises(ValueError):
+        read_cluster_info({"TF_CONFIG": json.dumps({"cluster": {}, "task": {}})})
+
+
+def test_find_free_ports_returns_distinct_ports():
+    ports = find_free_ports(3)
+
+    assert len(set(ports)) == 3
+
+
+def test_learning_rate_scaling_and_warmup():
+    target = scaled_learning_rate(0.0001, 4)
+
+    assert target == pytest.approx(0.0004)
+    assert warmup_learning_rate(0, 0.0001, target, 100) == pytest.approx(0.0001)
+    assert warmup_learning_rate(50, 0.0001, target, 100) == pytest.approx(0.00025)
+    assert warmup_learning_rate(100, 0.0001, target, 100) == target
+    assert warmup_learning_rate(5, 0.0001, target, 0) == target
+
+
+def test_only_chief_writes_to_real_filepath():
+    addresses = ["localhost:1", "localhost:2"]
+    chief = read_cluster_info({"TF_CONFIG": build_tf_config(addresses, 0)})
+    worker = read_cluster_info({"TF_CONFIG": build_tf_config(addresses, 1)})
+
+    assert write_filepath("model.h5", chief) == "model.h5"
+
+    worker_path = write_filepath("model.h5", worker)
+    assert worker_path != "model.h5" and worker_path.endswith("model.h5")
+
+    cleanup_filepath(worker_path, worker)
+    assert not os.path.exists(os.path.dirname(worker_path))
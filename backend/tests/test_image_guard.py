@@ -0,0 +1,139 @@
+import io
+import struct
+import zlib
+
+import pytest
+from image_guard import (
+    BYTES_PER_DECODED_PIXEL,
+    DecodeBudget,
+    DecodeBudgetExceededError,
+    ImageInfo,
+    ImageTooLargeError,
+    UnsupportedImageError,
+    plan_decode,
+    probe_image,
+)
+
+
+def _png_chunk(chunk_type, data):
+    body = chunk_type + data
+    return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+
+def _png(width, height, frames=None):
+    data = b"\x89PNG\r\n\x1a\n"
+    data += _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+    if frames is not None:
+        data += _png_chunk(b"acTL", struct.pack(">II", frames, 0))
+    return data + _png_chunk(b"IDAT", b"") + _png_chunk(b"IEND", b"")
+
+
+def _jpeg(width, height, sof_marker=0xC0, components=3):
+    app0 = b"JFIF\x00" + b"\x00" * 9
+    sof0 = struct.pack(">BHHB", 8, height, width, components) + b"\x00" * 3 * components
+    return (
+        b"\xff\xd8"
+        + b"\xff\xe0"
+        + struct.pack(">H", len(app0) + 2)
+        + app0
+        + bytes([0xFF, sof_marker])
+        + struct.pack(">H", len(sof0) + 2)
+        + sof0
+    )
+
+
+def _gif(width, height, frames):
+    data = b"GIF89a" + struct.pack("<HHBBB", width, height, 0, 0, 0)
+    for _ in range(frames):
+        data += b"\x21\xf9\x04\x00\x00\x00\x00\x00"  # graphic control extension
+        data += b"\x2c" + struct.pack("<HHHHB", 0, 0, width, height, 0)
+        data += b"\x02\x01\x00\x00"  # LZW code size, one data sub-block, terminator
+    return data + b"\x3b"
+
+
+def _webp_lossless(width, height):
+    bits = (width - 1) | ((height - 1) << 14)
+    chunk = b"VP8L" + struct.pack("<I", 5) + b"\x2f" + struct.pack("<I", bits) + b"\x00"
+    return b"RIFF" + struct.pack("<I", 4 + len(chunk)) + b"WEBP" + chunk
+
+
+def _bmp(width, height):
+    return b"BM" + b"\x00" * 12 + struct.pack("<Iii", 40, width, height)
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        (_png(640, 480), ImageInfo("png", 640, 480)),
+        (_png(64, 64, frames=12), ImageInfo("png", 64, 64, 12)),
+        (_jpeg(4000, 3000), ImageInfo("jpeg", 4000, 3000)),
+        (_jpeg(800, 600, sof_marker=0xC2), ImageInfo("jpeg", 800, 600, progressive=True)),
+        (_jpeg(800, 600, components=1), ImageInfo("jpeg", 800, 600, components=1)),
+        (_gif(100, 50, 3), ImageInfo("gif", 100, 50, 3)),
+        (_webp_lossless(1024, 768), ImageInfo("webp", 1024, 768)),
+        (_bmp(320, -200), ImageInfo("bmp", 320, 200)),
+    ],
+)
+def test_probe_image_reads_header_and_rewinds(data, expected):
+    stream = io.BytesIO(data)
+
+    assert probe_image(stream) == expected
+    assert stream.tell() == 0
+
+
+def test_probe_image_rejects_unknown_and_truncated_files():
+    with pytest.raises(UnsupportedImageError):
+        probe_image(io.BytesIO(b"not an image at all"))
+    with pytest.raises(UnsupportedImageError):
+        probe_image(io.BytesIO(_jpeg(100, 100)[:20]))
+
+
+def test_plan_decode_reduces_large_jpegs_only():
+    plan = plan_decode(ImageInfo("jpeg", 12000, 9000), 200_000_000, 16_000_000, 1)
+    assert plan.scale == 4
+    assert (plan.width, plan.height) == (3000, 2250)
+    assert plan.estimated_bytes == 3000 * 2250 * BYTES_PER_DECODED_PIXEL
+
+    assert plan_decode(ImageInfo("png", 1000, 1000), 200_000_000, 16_000_000, 1).scale == 1
+    with pytest.raises(ImageTooLargeError):
+        plan_decode(ImageInfo("png", 12000, 9000), 200_000_000, 16_000_000, 1)
+
+
+def test_plan_decode_counts_full_resolution_buffers_of_progressive_jpegs():
+    baseline = plan_decode(ImageInfo("jpeg", 12000, 9000), 200_000_000, 16_000_000, 1)
+    progressive = plan_decode(
+        ImageInfo("jpeg", 12000, 9000, progressive=True), 200_000_000, 16_000_000, 1
+    )
+
+    assert progressive.scale == baseline.scale == 4
+    assert progressive.estimated_bytes - baseline.estimated_bytes == 12000 * 9000 * 3 * 2
+    budget = DecodeBudget(512 * 1024 * 1024)
+    with budget.reserve(baseline.estimated_bytes):
+        pass
+    with pytest.raises(ImageTooLargeError):
+        with budget.reserve(progressive.estimated_bytes):
+            pass
+
+
+def test_plan_decode_enforces_pixel_and_frame_limits():
+    with pytest.raises(ImageTooLargeError):
+        plan_decode(ImageInfo("jpeg", 20000, 20000), 100_000_000, 16_000_000, 1)
+    with pytest.raises(ImageTooLargeError):
+        plan_decode(ImageInfo("gif", 100, 100, 500), 100_000_000, 16_000_000, 100)
+
+
+def test_decode_budget_blocks_until_released():
+    budget = DecodeBudget(100)
+
+    with budget.reserve(80):
+        assert budget.in_use == 80
+        with pytest.raises(DecodeBudgetExceededError):
+            with budget.reserve(40, timeout=0.01):
+                pass
+        with budget.reserve(20, timeout=0.01):
+            assert budget.in_use == 100
+
+    assert budget.in_use == 0
+    with pytest.raises(ImageTooLargeError):
+        with budget.reserve(101):
+            pass
@@ -0,0 +1,78 @@
+import contextlib
+import io
+import threading
+import tracemalloc
+import zipfile
+from pathlib import Path
+
+import profiling
+import pytest
+
+
+def _busy_loop(stop_event):
+    profiling.register_request_thread()
+    try:
+        while not stop_event.is_set():
+            sum(range(1000))
+    finally:
+        profiling.unregister_request_thread()
+
+
+def test_trace_is_noop_when_not_capturing():
+    assert not profiling.is_capturing()
+    assert isinstance(profiling.trace("predict"), contextlib.nullcontext)
+
+
+def test_capture_profile_returns_archive_with_cpu_and_memory_reports():
+    stop_event = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop_event,))
+    # Idle threads that are not serving a request must not show up in the samples.
+    idle = [threading.Thread(target=stop_event.wait) for _ in range(4)]
+    for thread in [worker, *idle]:
+        thread.start()
+    try:
+        data = profiling.capture_profile(0.3, tf_trace=False, sample_interval=0.002)
+    finally:
+        stop_event.set()
+        for thread in [worker, *idle]:
+            thread.join()
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        names = set(archive.namelist())
+        folded = archive.read("cpu_profile.folded").decode("utf-8")
+        summary = archive.read("summary.txt").decode("utf-8")
+
+    assert {"cpu_profile.folded", "cpu_profile_top.txt", "tracemalloc_top.txt"} <= names
+    assert folded
+    assert all("_busy_loop" in line for line in folded.splitlines())
+    assert "tf_trace: skipped" in summary
+    assert not profiling.is_capturing()
+
+
+def test_concurrent_capture_is_rejected():
+    with profiling._capture_lock:
+        with pytest.raises(profiling.ProfileInProgressError):
+            profiling.capture_profile(0.1, tf_trace=False)
+
+
+def test_profile_route_is_gated_by_flag_and_api_key():
+    content = (Path(__file__).resolve().parents[1] / "app.py").read_text(encoding="utf-8")
+
+    assert '@app.route("/admin/profile"' in content
+    assert "if not PROFILING_ENABLED:" in content
+    assert "app.before_request(register_request_thread)" in content
+    assert "if not API_KEY or not _is_request_authorized(request):" in content
+
+
+def test_tracemalloc_is_stopped_when_tf_trace_fails_to_stop(monkeypatch):
+    def fail_to_stop():
+        raise RuntimeError("could not write trace")
+
+    monkeypatch.setattr(profiling, "_start_tf_trace", lambda logdir: True)
+    monkeypatch.setattr(profiling, "_stop_tf_trace", fail_to_stop)
+
+    with pytest.raises(RuntimeError):
+        profiling.capture_profile(0.1)
+
+    assert not tracemalloc.is_tracing()
+    assert not profiling.is_capturing()
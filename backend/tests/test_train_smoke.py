@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+TRAIN_SCRIPT = BACKEND_DIR / "train.py"
+
+# Load the model exactly as app.py does, in a fresh interpreter so keras_compat
+# runs before TensorFlow is imported.
+LOAD_LIKE_APP = (
+    "import keras_compat\n"
+    "import tensorflow as tf\n"
+    "model = tf.keras.models.load_model('model.h5')\n"
+    "print(model.output_shape)\n"
+)
+
+
+def _write_images(directory, count):
+    directory.mkdir(parents=True)
+    for index in range(count):
+        pixels = tf.random.uniform((32, 32, 3), maxval=256, dtype=tf.int32)
+        tf.io.write_file(
+            str(directory / f"{index}.png"), tf.io.encode_png(tf.cast(pixels, tf.uint8))
+        )
+
+
+def test_two_local_workers_train_one_step(tmp_path):
+    for split in ("train", "test"):
+        for class_name in ("FAKE", "REAL"):
+            _write_images(tmp_path / "data" / split / class_name, 3)
+    # An odd number of validation images gives the two workers uneven shards.
+    (tmp_path / "data" / "test" / "REAL" / "0.png").unlink()
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            str(TRAIN_SCRIPT),
+            "--local-workers",
+            "2",
+            "--epochs",
+            "1",
+            "--steps-per-epoch",
+            "1",
+            "--weights",
+            "none",
+            "--data-dir",
+            str(tmp_path / "data"),
+        ],
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+        timeout=600,
+    )
+
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    loaded = subprocess.run(
+        [sys.executable, "-c", LOAD_LIKE_APP],
+        cwd=tmp_path,
+        env={**os.environ, "PYTHONPATH": str(BACKEND_DIR)},
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert loaded.returncode == 0, loaded.stderr
+    assert "(None, 1)" in loaded.stdout
+    # A completed run clears its backup, and non-chief workers leave no temp dirs behind.
+    assert not any((tmp_path / "training_backup").rglob("*"))
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "data",
+        "model.h5",
+        "model_checkpoint.h5",
+        "training_backup",
+    ]
@@ -1,49 +1,247 @@
+import argparse
+import math
 import os
-
+import sys
+
+import keras_compat  # noqa: F401  (selects tf-keras; must precede tensorflow)
+import tensorflow as tf
+from distributed import (
+    cleanup_filepath,
+    launch_local_workers,
+    read_cluster_info,
+    scaled_learning_rate,
+    warmup_learning_rate,
+    write_filepath,
+)
 from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint
-from tensorflow.keras.layers import Dense, GlobalAveragePooling2D
-from tensorflow.keras.models import Model
+from tensorflow.keras.callbacks import BackupAndRestore, EarlyStopping, ModelCheckpoint
+from tensorflow.keras.layers import (
+    Dense,
+    GlobalAveragePooling2D,
+    RandomFlip,
+    RandomRotation,
+    RandomZoom,
+)
+from tensorflow.keras.models import Model, Sequential
 from tensorflow.keras.optimizers import Adam
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 
-TRAIN_DIR = os.path.join(DATA_DIR, "train")
-TEST_DIR = os.path.join(DATA_DIR, "test")
-
 IMG_SIZE = (224, 224)
-BATCH_SIZE = 16  # Safe for laptop
+BATCH_SIZE = 16  # Per replica; safe for laptop
 EPOCHS = 8  # You selected 8
 LEARNING_RATE = 0.0001
+WARMUP_EPOCHS = 1  # Only applied when the learning rate is scaled up
+SHUFFLE_SEED = 1337
+
+CHECKPOINT_PATH = "model_checkpoint.h5"
+BACKUP_DIR = "training_backup"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif")
+
+
+# ==============================
+# DATA PIPELINE
+# ==============================
+
+
+def list_images(directory):
+    """Collect (paths, labels) with class indices in alphabetical order, like flow_from_directory."""
+    class_names = sorted(
+        name for name in os.listdir(directory) if os.path.isdir(os.path.join(directory, name))
+    )
+    paths, labels = [], []
+    for label, class_name in enumerate(class_names):
+        class_dir = os.path.join(directory, class_name)
+        for name in sorted(os.listdir(class_dir)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(class_dir, name))
+                labels.append(float(label))
+    return paths, labels, class_names
+
+
+def _load_image(path, label):
+    img = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    img = tf.image.resize(img, IMG_SIZE)
+    img = img / 255.0
+    return img, label
+
+
+def make_dataset_fn(paths, labels, global_batch_size):
+    """
+    Build the training dataset function for `strategy.distribute_datasets_from_function`.
+    File paths are sharded per worker before decoding so each worker only reads its own images.
+    """
+    augment = Sequential([RandomFlip("horizontal"), RandomRotation(10 / 360), RandomZoom(0.1)])
+
+    def dataset_fn(input_context):
+        batch_size = input_context.get_per_replica_batch_size(global_batch_size)
+        ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+        ds = ds.shard(input_context.num_input_pipelines, input_context.input_pipeline_id)
+        ds = ds.shuffle(len(paths), seed=SHUFFLE_SEED, reshuffle_each_iteration=True)
+        ds = ds.map(_load_image, num_parallel_calls=tf.data.AUTOTUNE)
+        # Repeat so every worker runs the same number of steps, even with uneven shards.
+        ds = ds.repeat().batch(batch_size)
+        ds = ds.map(
+            lambda x, y: (augment(x, training=True), y),
+            num_parallel_calls=tf.data.AUTOTUNE,
+        )
+        return ds.prefetch(tf.data.AUTOTUNE)
+
+    return dataset_fn
+
+
+def make_validation_dataset(paths, labels, global_batch_size):
+    """
+    Build a single finite pass over the validation set so each image is counted exactly once.
+    Keras distributes it by batch and handles the partial last batch and uneven shards.
+    """
+    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+    ds = ds.map(_load_image, num_parallel_calls=tf.data.AUTOTUNE)
+    ds = ds.batch(global_batch_size)
+    options = tf.data.Options()
+    options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.DATA
+    return ds.with_options(options).prefetch(tf.data.AUTOTUNE)
+
+
+# ==============================
+# DISTRIBUTION
+# ==============================
+
+
+def make_strategy(cluster_info):
+    if not cluster_info.is_distributed:
+        return tf.distribute.get_strategy()
+
+    # Ring all-reduce is the collective implementation that works on CPU-only nodes.
+    options = tf.distribute.experimental.CommunicationOptions(
+        implementation=tf.distribute.experimental.CommunicationImplementation.RING
+    )
+    return tf.distribute.MultiWorkerMirroredStrategy(communication_options=options)
+
+
+class LinearWarmup(tf.keras.callbacks.Callback):
+    """
+    Ramp the optimizer learning rate up to the scaled target over the first steps.
+    Driven by `optimizer.iterations` so a restored run does not warm up twice.
+    """
 
+    def __init__(self, base_lr, target_lr, warmup_steps):
+        super().__init__()
+        self.base_lr = base_lr
+        self.target_lr = target_lr
+        self.warmup_steps = warmup_steps
 
-def main():
+    def on_train_batch_begin(self, batch, logs=None):
+        step = int(self.model.optimizer.iterations.numpy())
+        if step <= self.warmup_steps:
+            self.model.optimizer.learning_rate.assign(
+                warmup_learning_rate(step, self.base_lr, self.target_lr, self.warmup_steps)
+            )
+
+
+# ==============================
+# CLI
+# ==============================
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the AI image detector.")
+    parser.add_argument(
+        "--local-workers",
+        type=int,
+        default=1,
+        help="Spawn this many local worker processes forming one training cluster.",
+    )
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument(
+        "--data-dir",
+        default=DATA_DIR,
+        help="Directory containing train/ and test/ class subfolders.",
+    )
+    parser.add_argument(
+        "--weights",
+        default="imagenet",
+        help="MobileNetV2 base weights: 'imagenet' or 'none' for random init.",
+    )
+    parser.add_argument(
+        "--steps-per-epoch",
+        type=int,
+        default=None,
+        help="Override steps per epoch (defaults to one pass over the training set).",
+    )
+    parser.add_argument("--backup-dir", default=BACKUP_DIR)
+    parser.add_argument(
+        "--backup-every-steps",
+        type=int,
+        default=None,
+        help="Also back up mid-epoch every N steps (defaults to once per epoch).",
+    )
+    return parser.parse_args(argv)
+
+
+def _worker_argv(args):
+    """Arguments forwarded to each spawned worker process."""
+    argv = [
+        "--epochs",
+        str(args.epochs),
+        "--data-dir",
+        args.data_dir,
+        "--weights",
+        args.weights,
+        "--backup-dir",
+        args.backup_dir,
+    ]
+    if args.steps_per_epoch is not None:
+        argv += ["--steps-per-epoch", str(args.steps_per_epoch)]
+    if args.backup_every_steps is not None:
+        argv += ["--backup-every-steps", str(args.backup_every_steps)]
+    return argv
+
+
+def main(argv=None):
+
+    args = parse_args(argv)
+
+    if args.local_workers > 1:
+        print(f"Launching {args.local_workers} local training workers...")
+        sys.exit(
+            launch_local_workers(args.local_workers, os.path.abspath(__file__), _worker_argv(args))
+        )
+
+    cluster_info = read_cluster_info()
+    strategy = make_strategy(cluster_info)
 
     print("====================================")
     print(" AI IMAGE DETECTOR - TRAINING START ")
     print("====================================\n")
 
+    if cluster_info.is_distributed:
+        print(
+            f"Worker {cluster_info.task_index + 1}/{cluster_info.num_workers} "
+            f"({'chief' if cluster_info.is_chief else 'worker'})"
+        )
+
     # ==============================
-    # DATA GENERATORS
+    # DATASETS (SHARDED PER WORKER)
     # ==============================
 
     print("Loading dataset...")
 
-    train_generator = ImageDataGenerator(
-        rescale=1.0 / 255, rotation_range=10, zoom_range=0.1, horizontal_flip=True
-    )
+    num_replicas = strategy.num_replicas_in_sync
+    global_batch_size = BATCH_SIZE * num_replicas
 
-    test_generator = ImageDataGenerator(rescale=1.0 / 255)
+    train_paths, train_labels, class_names = list_images(os.path.join(args.data_dir, "train"))
+    test_paths, test_labels, _ = list_images(os.path.join(args.data_dir, "test"))
+    print(f"Found {len(train_paths)} training and {len(test_paths)} validation images")
+    print(f"Classes: {class_names}")
 
-    train_data = train_generator.flow_from_directory(
-        TRAIN_DIR, target_size=IMG_SIZE, batch_size=BATCH_SIZE, class_mode="binary"
+    train_data = strategy.distribute_datasets_from_function(
+        make_dataset_fn(train_paths, train_labels, global_batch_size)
     )
+    test_data = make_validation_dataset(test_paths, test_labels, global_batch_size)
 
-    test_data = test_generator.flow_from_directory(
-        TEST_DIR, target_size=IMG_SIZE, batch_size=BATCH_SIZE, class_mode="binary", shuffle=False
-    )
+    steps_per_epoch = args.steps_per_epoch or math.ceil(len(train_paths) / global_batch_size)
 
     # ==============================
     # MODEL SETUP (MOBILENET)
@@ -51,43 +249,64 @@ def main():
 
     print("\nBuilding model...")
 
-    base_model = MobileNetV2(weights="imagenet", include_top=False, input_shape=(224, 224, 3))
+    target_lr = scaled_learning_rate(LEARNING_RATE, num_replicas)
 
-    # Freeze base model layers
-    base_model.trainable = False
+    with strategy.scope():
+        base_model = MobileNetV2(
+            weights=None if args.weights == "none" else args.weights,
+            include_top=False,
+            input_shape=(224, 224, 3),
+        )
 
-    x = base_model.output
-    x = GlobalAveragePooling2D()(x)
-    x = Dense(128, activation="relu")(x)
-    output = Dense(1, activation="sigmoid")(x)
+        # Freeze base model layers
+        base_model.trainable = False
 
-    model = Model(inputs=base_model.input, outputs=output)
+        x = base_model.output
+        x = GlobalAveragePooling2D()(x)
+        x = Dense(128, activation="relu")(x)
+        output = Dense(1, activation="sigmoid")(x)
 
-    # ==============================
-    # COMPILE MODEL
-    # ==============================
+        model = Model(inputs=base_model.input, outputs=output)
 
-    model.compile(
-        optimizer=Adam(learning_rate=LEARNING_RATE),
-        loss="binary_crossentropy",
-        metrics=["accuracy"],
-    )
+        # ==============================
+        # COMPILE MODEL
+        # ==============================
+
+        model.compile(
+            optimizer=Adam(learning_rate=target_lr),
+            loss="binary_crossentropy",
+            metrics=["accuracy"],
+        )
 
-    model.summary()
+    if cluster_info.is_chief:
+        model.summary()
 
     # ==============================
-    # CALLBACKS (AUTO SAVE + STOP)
+    # CALLBACKS (BACKUP + SAVE + STOP)
     # ==============================
 
     print("\nSetting callbacks...")
 
+    # Restores model, optimizer and epoch counter after a worker crash or restart.
+    # With tf-keras, only the chief writes to backup_dir; other workers use temp dirs
+    # and every worker restores from the chief's backup.
+    backup = BackupAndRestore(
+        backup_dir=args.backup_dir, save_freq=args.backup_every_steps or "epoch"
+    )
+
+    checkpoint_path = write_filepath(CHECKPOINT_PATH, cluster_info)
     checkpoint = ModelCheckpoint(
-        "model_checkpoint.h5", monitor="val_accuracy", save_best_only=True, verbose=1
+        checkpoint_path, monitor="val_accuracy", save_best_only=True, verbose=1
     )
 
     early_stop = EarlyStopping(monitor="val_loss", patience=2, restore_best_weights=True)
 
-    callbacks = [checkpoint, early_stop]
+    callbacks = [backup, checkpoint, early_stop]
+
+    if target_lr != LEARNING_RATE:
+        warmup_steps = WARMUP_EPOCHS * steps_per_epoch
+        print(f"Scaled learning rate {LEARNING_RATE} -> {target_lr} over {warmup_steps} steps")
+        callbacks.append(LinearWarmup(LEARNING_RATE, target_lr, warmup_steps))
 
     # ==============================
     # TRAINING
@@ -95,7 +314,15 @@ def main():
 
     print("\nTraining started...\n")
 
-    model.fit(train_data, validation_data=test_data, epochs=EPOCHS, callbacks=callbacks)
+    model.fit(
+        train_data,
+        validation_data=test_data,
+        epochs=args.epochs,
+        steps_per_epoch=steps_per_epoch,
+        callbacks=callbacks,
+    )
+
+    cleanup_filepath(checkpoint_path, cluster_info)
 
     # ==============================
     # FINAL SAVE
@@ -103,7 +330,13 @@ def main():
 
     print("\nSaving final model...")
 
-    model.save("model.h5")
+    # All workers save; only the chief writes to model.h5.
+    model_path = write_filepath("model.h5", cluster_info)
+    model.save(model_path)
+    cleanup_filepath(model_path, cluster_info)
+
+    if not cluster_info.is_chief:
+        return
 
     print("\n====================================")
     print(" TRAINING COMPLETED SUCCESSFULLY ✅ ")